@@ -44,10 +44,14 @@ for longer than the long_press_interval, then the long_press_action
 will be triggered. This can be used (just like a real Wemo!) to allow
 one switch to control two devices.
 
-This module relies on RPi.GPIO, documented at
-  https://sourceforge.net/p/raspberry-gpio-python/wiki/Home/
+This module relies on the libgpiod Python bindings (v2, "pip install
+gpiod"), which use the GPIO character device rather than /dev/mem or
+sysfs. Edges on the input pin are debounced in the kernel and delivered
+on a file descriptor watched by the event loop. See
+  https://git.kernel.org/pub/scm/libs/libgpiod/libgpiod.git/about/
 
-Pin numbers assume BOARD numbering and not BCM numbering.
+Pin numbers are line offsets on GPIO_CHIP, which on a Raspberry Pi are
+the BCM numbers, not the BOARD numbers.
 
 Example config:
 ```
@@ -76,37 +80,48 @@ Example config:
 ```
 """
 
-import RPi.GPIO as GPIO
+import gpiod
+from gpiod.line import Bias, Direction, Edge, Value
 from fauxmo import logger
-from datetime import datetime, timedelta
+from datetime import timedelta
 import asyncio
 import shlex
 import subprocess
-from time import sleep
 
 from pairedfauxmoplugin import PairedFauxmoPlugin
 
+# GPIO character device the pins are requested from
+GPIO_CHIP = "/dev/gpiochip0"
 
-def _run_cmd(cmd: str) -> bool:
+# in seconds, how long the input pin must hold a new level before the
+# kernel reports the change as a press or release of the switch
+DEBOUNCE_INTERVAL = 0.02
+
+
+def _value(val: bool) -> Value:
+    "Convert a bool into the gpiod value to drive a line to"
+    return Value.ACTIVE if val else Value.INACTIVE
+
+
+def _ignore(*args) -> None:
+    "Stand-in for methods that have nothing to do in this configuration"
+    pass
+
+
+def _run_cmd(argv: list) -> bool:
     """Run a given command in the background, with no error checking.
 
     Args:
-       cmd: Command to be run
+       argv: Command to be run, already split by shlex
     Returns:
        True if command seems to have run without error
     """
-    shlexed_cmd = shlex.split(cmd)
-    subprocess.Popen(shlexed_cmd)
+    subprocess.Popen(argv)
 
 
 class FauxmoGpioPlugin(PairedFauxmoPlugin):
     """Fauxmo Plugin for triggering GPIO lines on a Raspberry Pi."""
 
-    # Class variable to track number of running instances. Used to
-    # ensure only the LAST instance calls GPIO.close() to shut down
-    # GPIO access
-    _num_instances = 0
-
     def __init__(self,
                  name: str,
                  port: int,
@@ -128,7 +143,7 @@ class FauxmoGpioPlugin(PairedFauxmoPlugin):
 
             --- must specify one of the following ---
 
-            output_pin: RPi.GPIO pin (using BOARD numbering) to control
+            output_pin: GPIO pin (using BCM numbering) to control
 
             output_cmds: a 2-element string array; first command will
               be run to turn the device "on", second will be run to
@@ -136,7 +151,7 @@ class FauxmoGpioPlugin(PairedFauxmoPlugin):
 
             --- from here down the args are optional ---
 
-            input_pin: RPi.GPIO pin (using BOARD numbering) which maps
+            input_pin: GPIO pin (using BCM numbering) which maps
               to a momentary-contact input switch. When a rising edge
               is detected on this pin, the state of the device will be
               toggled. Default is for the input_pin to not be
@@ -144,8 +159,8 @@ class FauxmoGpioPlugin(PairedFauxmoPlugin):
 
             input_pull_dir: Either "Down" or "Up". Default is Down.
 
-            notification_pin: RPi.GPIO pin (using BOARD numbering)
-              which maps to an LED. The LED will be used for user
+            notification_pin: GPIO pin (using BCM numbering) which
+              maps to an LED. The LED will be used for user
               feedback while pressing buttons, and to indicate whether
               the schedule is set or not.
 
@@ -165,9 +180,12 @@ class FauxmoGpioPlugin(PairedFauxmoPlugin):
             self.state = state
         else:
             self.state = False   # True = on, False = off
+        # get_state() is called often (e.g. by a paired plugin), so the
+        # string form of the state is kept alongside it
+        self.state_str = "on" if self.state else "off"
 
         # Don't need to validate the output_pin, input_pin etc;
-        # RPi.GPIO will throw ValueError if a pin is illegal
+        # gpiod will raise an error if a pin is illegal
 
         if ( type == "toggle" ):
             self.toggle = True
@@ -189,57 +207,107 @@ class FauxmoGpioPlugin(PairedFauxmoPlugin):
         self.notification_pin = notification_pin
 
         if (not input_pull_dir or input_pull_dir.lower() == "down"):
-            self.input_pull_dir = GPIO.PUD_DOWN
+            self.input_pull_dir = Bias.PULL_DOWN
         elif input_pull_dir.lower() == "up":
-            self.input_pull_dir = GPIO.PUD_UP
+            self.input_pull_dir = Bias.PULL_UP
         else:
             raise ValueError(f"input_pull_dir must be either Up or Down, "
                              "not {input_pull_dir}")
 
         self.long_press_interval = long_press_interval
         self.long_press_action = long_press_action
+        if self.long_press_interval:
+            self.lp_interval_s = self.long_press_interval / 1000.0
+        else:
+            self.lp_interval_s = None
 
         if self.long_press_interval is not None and \
            self.long_press_action is None:
             raise ValueError("long_press_action required but not found!")
 
+        # split the commands once, rather than every time one is run
+        if self.output_cmds is not None:
+            self.output_argvs = [shlex.split(c) for c in self.output_cmds]
+        if self.long_press_action not in (None, "toggle_paired_device"):
+            self.long_press_argv = shlex.split(self.long_press_action)
+
         # in msec, how fast the notification light should pulse when
         # the schedule is set. First number is on time, second is off time
         self.schedule_notification_interval = (50, 1500)
 
-        self.gpio_setup()
-
-        self.loop = asyncio.get_event_loop()
-        self.loop_running = True
-        if self.input_pin:
-            self.task = self.loop.create_task(self.gpio_timer())
+        # Button and notification state, driven by edge events on the
+        # input pin rather than by polling it
+        self.input_level = False
+        self.pressed = False
+        self.long_press_handle = None
+        self.long_press_fired = False
+        self.notif_delta = (0, 0)   # (on, off) msec; (0, 0) is steady
+        self.notif_val = False      # last value written to notification_pin
+        self.blink_handle = None
+        self.toggle_task = None     # latest TOGGLE pulse, see _pulse()
+
+        # The configuration is fixed, so decide once which output code
+        # to run, and stub out the notification methods if there is no
+        # notification pin, rather than testing for it on every event
+        if self.output_pin:
+            self._drive_output = self._drive_output_pin
+        else:
+            self._drive_output = self._drive_output_cmds
+        if not self.notification_pin:
+            self._update_notif = self._set_notif = self._set_blink = _ignore
 
-        FauxmoGpioPlugin._num_instances += 1
+        # set by _start() once the event loop is running
+        self.loop = None
+        self.gpio_setup()
+        asyncio.ensure_future(self._start())
 
         super().__init__(name=name, port=port)
         logger.info(f"Fauxmo GPIO device {self.name} initialized")
 
     def gpio_setup(self):
-        "Set up the GPIO for the pins we're using"
+        "Request the GPIO lines for the pins we're using"
 
-# TODO CHECKME!!!        GPIO.setmode(GPIO.BOARD)
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
+        config = {}
 
         # Output pin
         if (self.output_pin):
-            GPIO.setup(self.output_pin, GPIO.OUT)
-            GPIO.output(self.output_pin, self.state)
+            config[self.output_pin] = gpiod.LineSettings(
+                direction=Direction.OUTPUT,
+                output_value=_value(self.state))
 
         # Input pin
         if self.input_pin:
-            GPIO.setup(self.input_pin, GPIO.IN,
-                       pull_up_down=self.input_pull_dir)
+            config[self.input_pin] = gpiod.LineSettings(
+                direction=Direction.INPUT,
+                bias=self.input_pull_dir,
+                edge_detection=Edge.BOTH,
+                debounce_period=timedelta(seconds=DEBOUNCE_INTERVAL))
 
         # Notification pin
         if self.notification_pin:
-            GPIO.setup(self.notification_pin, GPIO.OUT)
-            GPIO.output(self.notification_pin, self.state)
+            config[self.notification_pin] = gpiod.LineSettings(
+                direction=Direction.OUTPUT,
+                output_value=_value(self.state))
+            self.notif_val = bool(self.state)
+
+        self.lines = None
+        if config:
+            self.lines = gpiod.request_lines(GPIO_CHIP, consumer="fauxmo",
+                                             config=config)
+
+        # start from the switch's actual level, so the first edge is
+        # interpreted correctly even if the input is high at startup
+        if self.input_pin:
+            self.input_level = (self.lines.get_value(self.input_pin) ==
+                                Value.ACTIVE)
+
+    async def _start(self):
+        """Runs once the event loop has started, and hence after every
+        plugin has been constructed and paired."""
+        self.loop = asyncio.get_running_loop()
+        if self.input_pin:
+            self.loop.add_reader(self.lines.fd, self._drain_edges)
+        self._update_notif()
 
     def is_schedule_on(self) -> bool:
         """Returns True if a schedule is set.
@@ -253,105 +321,136 @@ class FauxmoGpioPlugin(PairedFauxmoPlugin):
         if self.long_press_action == "toggle_paired_device":
             self.set_pair_state(not self.is_schedule_on())
             return
-        _run_cmd(self.long_press_action)
+        _run_cmd(self.long_press_argv)
+
+    def pair_state_changed(self) -> None:
+        """The schedule was turned on or off; update the notification pin."""
+        self._update_notif()
+
+    def _drain_edges(self) -> None:
+        """Called by the event loop when edge events are waiting on the
+        input line. The kernel has already debounced them."""
+        for event in self.lines.read_edge_events():
+            level = (event.event_type == event.Type.RISING_EDGE)
+            if level != self.input_level:
+                self.input_level = level
+                self._handle_edge(level)
+
+    def _handle_edge(self, pressed: bool) -> None:
+        """Process a debounced press or release of the switch on
+        input_pin."""
+        if pressed:                                 # button is depressed
+            self.pressed = True
+            self.long_press_fired = False
+            if self.lp_interval_s:
+                self.long_press_handle = self.loop.call_later(
+                    self.lp_interval_s, self._on_long_press)
+            self._set_blink((40, 80))   # on time in msec, off time
+
+        elif self.pressed:                          # button has been released
+            if self.long_press_handle:
+                self.long_press_handle.cancel()
+                self.long_press_handle = None
+            if self.long_press_fired:
+                self.trigger_long_press()
+            else:                                   # short press
+                self.set_state(not self.state, "button press")
+            # pressed is cleared only now, so that a schedule toggled by
+            # the long press does not update the notification pin (and
+            # query the schedule state) a second time via
+            # pair_state_changed
+            self.pressed = False
+            self._update_notif()
+
+    def _on_long_press(self) -> None:
+        """The switch has been held for long_press_interval."""
+        self.long_press_handle = None
+        self.long_press_fired = True
+        self._set_blink((0, 0))
+        self._set_notif(True)
+
+    def _update_notif(self) -> None:
+        """Reset the notification pin to reflect the output and schedule."""
+        if self.pressed:
+            # the switch owns the notification pin until it is released
+            return
+        self._set_notif(self.state)
+        if self.is_schedule_on():
+            self._set_blink(self.schedule_notification_interval)
+        else:
+            self._set_blink((0, 0))
 
-    async def gpio_timer(self):
-        """Timer loop to receive switch events. If input_pin is not configured,
-        this loop will not run."""
+    def _drive_output_pin(self, state: bool) -> None:
+        "Drive output_pin to the given state"
+        self.lines.set_value(self.output_pin, _value(state))
 
-        if self.long_press_interval:
-            lp_interval = timedelta(milliseconds=self.long_press_interval)
+    def _drive_output_cmds(self, state: bool) -> None:
+        "Run the output command for the given state"
+        if state:
+            _run_cmd(self.output_argvs[0])
         else:
-            # setting this to 10 minutes is equivalent to disabling it!
-            lp_interval = timedelta(seconds=600)
-
-        press_tm = None
-
-        notif_tog_tm = datetime.now()
-        notif_delta = 0
-        local_is_schedule_on = not self.is_schedule_on()
-
-        while (self.loop_running):
-            if GPIO.input(self.input_pin):         # button is depressed
-                if not press_tm:
-                    press_tm = datetime.now()
-                    notif_tog_tm = datetime.now()
-                    notif_delta = (40, 80)   # on time in msec, off time
-
-                if (datetime.now() - press_tm) > lp_interval:
-                    notif_delta = 0
-                    if (self.notification_pin):
-                        GPIO.output(self.notification_pin, True)
-
-            elif press_tm:                          # button has been released
-                if (datetime.now() - press_tm) < timedelta(milliseconds=50):
-                    logger.info(f"{self.name}: very short press, ignoring")
-                elif (datetime.now() - press_tm) < lp_interval:  # short press
-                    self.set_state(not self.state, "button press")
-                else:     # long press
-                    self.trigger_long_press()
-                press_tm = None
-                if self.is_schedule_on():
-                    notif_delta = self.schedule_notification_interval
-                else:
-                    notif_delta = 0
-                if (self.notification_pin):
-                    GPIO.output(self.notification_pin, self.state)
-
-            if self.is_schedule_on() != local_is_schedule_on:
-                if self.is_schedule_on():
-                    notif_delta = self.schedule_notification_interval
-                    local_is_schedule_on = True
-                else:
-                    notif_delta = 0
-                    local_is_schedule_on = False
-
-            if (notif_delta and self.notification_pin and
-                datetime.now() >= notif_tog_tm):
-                cur_val = GPIO.input(self.notification_pin)
-                if type(notif_delta) is tuple:
-                    delta = notif_delta[cur_val]
-                else:
-                    delta = notif_delta
-                notif_tog_tm = datetime.now() + timedelta(milliseconds=delta)
-                GPIO.output(self.notification_pin, not cur_val)
-
-            await asyncio.sleep(0.02)
-
-        logger.info(f"{self.name}: gpio_timer exiting")
+            _run_cmd(self.output_argvs[1])
+
+    def _set_notif(self, val: bool) -> None:
+        """Drive the notification pin, skipping the write if the pin
+        already has that value."""
+        val = bool(val)
+        if val != self.notif_val:
+            self.lines.set_value(self.notification_pin, _value(val))
+            self.notif_val = val
+
+    def _set_blink(self, notif_delta: tuple) -> None:
+        """Start blinking the notification pin with the given (on, off)
+        times in msec, or stop blinking if notif_delta is (0, 0)."""
+        self.notif_delta = notif_delta
+        if self.blink_handle:
+            self.blink_handle.cancel()
+            self.blink_handle = None
+        if notif_delta[0]:
+            self._blink()
+
+    def _blink(self) -> None:
+        """Toggle the notification pin, and schedule the next toggle."""
+        cur_val = self.notif_val
+        delta = self.notif_delta[cur_val]
+        self._set_notif(not cur_val)
+        self.blink_handle = self.loop.call_later(delta / 1000, self._blink)
 
     def set_state(self, state: bool, reason: str = "unspecified") -> None:
         "Set the plugin into the given state"
         if (state == self.state):
             return
         self.state = state
-        if self.output_pin:
-            GPIO.output(self.output_pin, self.state)
-        elif state:
-            _run_cmd(self.output_cmds[0])
-        else:
-            _run_cmd(self.output_cmds[1])
-
-        if (self.notification_pin):
-            GPIO.output(self.notification_pin, self.state)
+        self.state_str = "on" if state else "off"
+        self._drive_output(state)
+        self._set_notif(state)
 
         newval = "ON" if self.state else "OFF"
         logger.info(f"{self.name}: Turned {newval} on {reason}")
 
     def close(self) -> None:
         "Shut down cleanly"
-        self.loop_running = False
-        self.loop.run_until_complete(self.task)
+        if self.input_pin and self.loop is not None:
+            self.loop.remove_reader(self.lines.fd)
+        if self.long_press_handle:
+            self.long_press_handle.cancel()
+        if self.toggle_task is not None:
+            # cancelling the newest pulse also cancels the ones queued
+            # before it; let them restore output_pin before release
+            self.toggle_task.cancel()
+            loop = self.toggle_task.get_loop()
+            if not loop.is_running() and not loop.is_closed():
+                loop.run_until_complete(asyncio.wait([self.toggle_task]))
+        self._set_blink((0, 0))
         self.set_state(False, "shutdown")
-        FauxmoGpioPlugin._num_instances -= 1
-        if (FauxmoGpioPlugin._num_instances == 0):
-            GPIO.cleanup()
+        if self.lines is not None:
+            self.lines.release()
         logger.info(f"{self.name}: Shutdown complete")
 
     def on(self) -> bool:
         "Run the on command.  Returns true if command succeeded"
         if (self.toggle):
-             self._toggle(True)
+             self._pulse(True)
         else:
              self.set_state(True, "wemo command")
         return True
@@ -359,24 +458,38 @@ class FauxmoGpioPlugin(PairedFauxmoPlugin):
     def off(self) -> bool:
         "Run the on command.  Returns true if command succeeded"
         if (self.toggle):
-             self._toggle(False)
+             self._pulse(False)
         else:
              self.set_state(False, "wemo command")
         return True
 
-    def _toggle(self, state: bool) -> None:
-        "Run the TOGGLE command.  Returns true if command succeeded"
-        GPIO.output(self.output_pin, False)
-        logger.info(f"{self.name}: Turned to --> {not self.state}")
-        sleep(0.1)
-        GPIO.output(self.output_pin, True)
-        logger.info(f"{self.name}: Turned back to --> {self.state}")
+    def _pulse(self, state: bool) -> None:
+        """Record the new state, and queue a TOGGLE pulse behind any
+        pulse still in progress, so that back-to-back pulses stay
+        separate rather than merging into one."""
         self.state = state
+        self.state_str = "on" if state else "off"
+        self.toggle_task = asyncio.ensure_future(
+            self._toggle(state, self.toggle_task))
+
+    async def _toggle(self, state: bool, previous: asyncio.Task) -> None:
+        """Run the TOGGLE command: once the previous pulse (if any) has
+        finished, pulse output_pin low for 100 msec. Scheduled as a
+        task, so the pulse does not block the event loop."""
+        if previous is not None:
+            try:
+                await previous
+            except Exception:
+                pass
+        self.lines.set_value(self.output_pin, Value.INACTIVE)
+        logger.info(f"{self.name}: Pulsing output to turn --> {state}")
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            self.lines.set_value(self.output_pin, Value.ACTIVE)
+        logger.info(f"{self.name}: Pulse done, now --> {state}")
 
     def get_state(self) -> str:
         "Get device state. Returns one of the strings 'on' or 'off'"
 #        return "unknown"
-        if self.state:
-            return "on"
-        else:
-            return "off"
+        return self.state_str
@@ -80,10 +80,18 @@ class PairedFauxmoPlugin(FauxmoPlugin):
 
     3) While running, either plugin can call get_pair_state() or
     set_pair_state() to get or set the state of the paired device.
+
+    4) A plugin that changes its own state can call notify_pair(); the
+    paired device's pair_state_changed() will then be invoked, so it
+    can react without having to poll get_pair_state().
     """
 
     _instances = {}
 
+    # Maps a paired_device_name to the instance that named it, so an
+    # instance can find the plugin that names it without a scan
+    _reverse_pairs = {}
+
     def __init__(self,
                  name: str,
                  port: int,
@@ -100,6 +108,8 @@ class PairedFauxmoPlugin(FauxmoPlugin):
         if name in PairedFauxmoPlugin._instances:
             raise ValueError(f"Error: Duplicate plugin name {name}")
         PairedFauxmoPlugin._instances[name] = self
+        if paired_device_name is not None:
+            PairedFauxmoPlugin._reverse_pairs[paired_device_name] = self
 
         self.paired_name = paired_device_name
         self.paired_instance = None
@@ -118,23 +128,20 @@ class PairedFauxmoPlugin(FauxmoPlugin):
         cls = PairedFauxmoPlugin
 
         if self.paired_name is not None:
-            if self.paired_name in cls._instances:
-                self.paired_instance = cls._instances[self.paired_name]
-                return self.paired_instance
-            else:
-                return None
+            self.paired_instance = cls._instances.get(self.paired_name)
+            return self.paired_instance
 
         # both paired_name and paired_instance are None; attempt to
         # see if another instance has our instance name as it's
         # paired_name
-        for name, inst in cls._instances.items():
-            if inst.paired_name == self.name:
-                self.paired_name = inst.name
-                self.paired_instance = inst
-                inst.paired_instance = self
-                return inst
+        inst = cls._reverse_pairs.get(self.name)
+        if inst is None:
+            return None
 
-        return None
+        self.paired_name = inst.name
+        self.paired_instance = inst
+        inst.paired_instance = self
+        return inst
 
     def get_pair_state(self) -> str:
         """Returns the state of the paired device.
@@ -158,3 +165,15 @@ class PairedFauxmoPlugin(FauxmoPlugin):
             pair_inst.on()
         else:
             pair_inst.off()
+
+    def notify_pair(self) -> None:
+        """Tell the paired device that our state has changed."""
+        pair_inst = self._lookup_paired_device()
+        if pair_inst is None:
+            return
+        pair_inst.pair_state_changed()
+
+    def pair_state_changed(self) -> None:
+        """Called when the paired device changes state. Does nothing by
+        default; override to react to the change."""
+        pass
@@ -52,6 +52,42 @@ from pairedfauxmoplugin import PairedFauxmoPlugin
 
 a = Astral()
 
+_TIME_RE = re.compile(r"([0-2]?[0-9]):([0-5][0-9])(:[0-5][0-9])?")
+_SUN_RE = re.compile(r"(sunrise|sunset)([-+]\d+)?")
+
+# Longest the timer will sleep, in seconds, before re-reading the wall
+# clock. Bounds the damage if the clock jumps (NTP sync after boot, DST)
+_MAX_SLEEP = 60
+
+
+class SchedEvent:
+    """A single schedule event, as returned by
+    SchedulerPlugin._parse_sched_entry. Attributes are slotted rather
+    than held in a dict, since the timer reads them on every pass."""
+
+    __slots__ = ('type', 'offset', 'random', 'base_time', 'value',
+                 'time', 'processed')
+
+    def __init__(self,
+                 type: str,
+                 offset: int,
+                 random: int,
+                 base_time: time,
+                 value: bool) -> None:
+        self.type = type
+        self.offset = offset
+        self.random = random
+        self.base_time = base_time
+        self.value = value
+        self.time = None
+        self.processed = False
+
+    def __repr__(self) -> str:
+        return (f"SchedEvent(type={self.type!r}, offset={self.offset}, "
+                f"random={self.random}, base_time={self.base_time}, "
+                f"value={self.value}, time={self.time}, "
+                f"processed={self.processed})")
+
 
 class SchedulerPlugin(PairedFauxmoPlugin):
     """Plugin for adding a schedule to another plugin."""
@@ -102,14 +138,18 @@ class SchedulerPlugin(PairedFauxmoPlugin):
               is ON or OFF at startup. If not specified, ON is assumed.
         """
         self.state = initial_state
+        self.state_str = "on" if initial_state else "off"
         self.timezone = pytz.timezone(timezone)
         self.latitude = latitude
         self.longitude = longitude
 
         # Internally, we maintain the self.schedule list, which is a
-        # list of schedule events. Each element in the list is a dict
-        # of the form specified in the comment for _parse_sched_entry
+        # list of schedule events. Each element in the list is a
+        # SchedEvent, as described in the comment for _parse_sched_entry.
+        # reset_schedule keeps the list sorted by today's event time, and
+        # self.next_idx is the index of the first unprocessed event
         self.schedule = []
+        self.next_idx = 0
         if schedule_events:
             for e in schedule_events:
                 self.schedule.append(self._parse_sched_entry(e))
@@ -118,15 +158,15 @@ class SchedulerPlugin(PairedFauxmoPlugin):
 
         self.is_schedule_on = bool(self.schedule)
 
-        self.loop = asyncio.get_event_loop()
-        self.loop_running = True
-        self.task = self.loop.create_task(self.timer())
+        self.loop = None
+        self.wake = None
+        self.task = asyncio.ensure_future(self.timer())
 
         super().__init__(name=name, port=port,
                          paired_device_name=paired_device)
         logger.info(f"Fauxmo schedule device {self.name} initialized")
 
-    def _parse_sched_entry(self, e: dict):
+    def _parse_sched_entry(self, e: dict) -> SchedEvent:
         """Parse an input schedule event.
 
         The event is assumed to be a dict with three keys: trigger,
@@ -141,23 +181,22 @@ class SchedulerPlugin(PairedFauxmoPlugin):
            (where N, if specified, is the number of minutes offset from
            sunrise or sunset).
 
-        Returns: a schedule dict of the form
-              (type, offset, time, value, processed)
+        Returns: a SchedEvent with the following attributes
 
-           'type': one of "fixed", "sunrise", "sunset"
-           'offset': for sunrise and sunset events, offset in minutes
+           type: one of "fixed", "sunrise", "sunset"
+           offset: for sunrise and sunset events, offset in minutes
               (can be negative)
-           'random': int specifying the randomization value in minutes
-           'base_time': for fixed events, the datetime.time value for
+           random: int specifying the randomization value in minutes
+           base_time: for fixed events, the datetime.time value for
               this event, in naive format (no timezone)
-           'value': true to turn on, false to turn off
+           value: true to turn on, false to turn off
 
            --- values above are not changes except in this function;
            --- values below are changed daily
 
-           'time': TODAY'S datetime.time value for this event, taking
+           time: TODAY'S datetime.time value for this event, taking
               into account sunrise, sunset, and randomization values
-           'processed': true if this event has been processed today, false
+           processed: true if this event has been processed today, false
               otherwise
         """
         trigger = e['trigger']
@@ -167,104 +206,156 @@ class SchedulerPlugin(PairedFauxmoPlugin):
         value = e['value']
 
         # first, try fixed time
-        m = re.fullmatch("([0-2]?[0-9]):([0-5][0-9])(:[0-5][0-9])?", trigger)
+        m = _TIME_RE.fullmatch(trigger)
         if m:
             hour = int(m.group(1))
             minute = int(m.group(2))
             second = 0
             if m.group(3):
                 second = int(m.group(3)[1:])
-            return ({'type': 'fixed',
-                     'offset': 0,
-                     'random': random,
-                     'base_time': time(hour, minute, second),
-                     'value': value,
-                     'time': None,
-                     'processed': False})
-
-        m = re.fullmatch("(sunrise|sunset)([-+]\d+)?", trigger)
+            return SchedEvent(type='fixed',
+                              offset=0,
+                              random=random,
+                              base_time=time(hour, minute, second),
+                              value=value)
+
+        m = _SUN_RE.fullmatch(trigger)
         if m:
             offset = 0
             if m.group(2):
                 offset = int(m.group(2))
-            return({'type': m.group(1),
-                    'offset': offset,
-                    'random': random,
-                    'base_time': None,
-                    'value': value,
-                    'time': None,
-                    'processed': False})
+            return SchedEvent(type=m.group(1),
+                              offset=offset,
+                              random=random,
+                              base_time=None,
+                              value=value)
 
         raise ValueError(f"Illegal schedule trigger: {trigger}")
 
     async def timer(self):
-        "Timer loop to watch for schedule events."
-
-        while (self.loop_running):
-            if datetime.now(self.timezone).date() > self.sched_reset_for:
-                self.reset_schedule()
-
-            # process any schedule events
-            if self.state:
-                now = datetime.now(self.timezone).time()
-                for e in self.schedule:
-                    if now > e['time'] and not e['processed']:
-                        self.set_pair_state(e['value'])
-                        e['processed'] = True
-
-            # only sleep 1 sec, otherwise teardown time is too long
-            await asyncio.sleep(1)
+        """Timer loop to watch for schedule events. Runs until cancelled
+        by close()."""
+
+        self.loop = asyncio.get_running_loop()
+        try:
+            while True:
+                # read the clock once per pass, and use it throughout
+                now = datetime.now(self.timezone)
+                if now.date() > self.sched_reset_for:
+                    self.reset_schedule(now)
+
+                # process any schedule events that have come due
+                if self.state:
+                    now_t = now.time()
+                    while (self.next_idx < len(self.schedule) and
+                           now_t > self.schedule[self.next_idx].time):
+                        e = self.schedule[self.next_idx]
+                        self.set_pair_state(e.value)
+                        e.processed = True
+                        self.next_idx += 1
+
+                # sleep until the next event is due; on() and off()
+                # resolve self.wake to cut the sleep short. (Unlike
+                # wait_for, asyncio.wait never swallows a cancellation.)
+                self.wake = self.loop.create_future()
+                await asyncio.wait([self.wake],
+                                   timeout=self._sleep_interval(now))
+        except asyncio.CancelledError:
+            pass
 
         logger.info(f"{self.name}: timer exiting")
 
+    def _sleep_interval(self, now: datetime) -> float:
+        """Return the number of seconds from now until the timer next
+        needs to run: when the next pending event is due, or midnight if
+        there is none, but never more than _MAX_SLEEP."""
+        naive_now = now.replace(tzinfo=None)
+        wake_dt = datetime.combine(naive_now.date() + timedelta(days=1),
+                                   time())
+        if self.state and self.next_idx < len(self.schedule):
+            wake_dt = datetime.combine(naive_now.date(),
+                                       self.schedule[self.next_idx].time)
+
+        # events fire once the time is strictly past e.time
+        delta = (wake_dt - naive_now).total_seconds() + 0.01
+        return min(max(delta, 0), _MAX_SLEEP)
+
+    def _wake_timer(self) -> None:
+        "Cut the timer's current sleep short"
+        if self.wake is not None and not self.wake.done():
+            self.wake.set_result(None)
+
     def close(self) -> None:
         "Shut down cleanly"
-        self.loop_running = False
-        self.loop.run_until_complete(self.task)
+        self.task.cancel()
+        loop = self.task.get_loop()
+        if not loop.is_running() and not loop.is_closed():
+            # let the timer see the cancellation; asyncio.wait does not
+            # raise if the task was cancelled before it ever started
+            loop.run_until_complete(asyncio.wait([self.task]))
         logger.info(f"{self.name}: Shutdown complete")
 
-    def reset_schedule(self):
+    def reset_schedule(self, now: datetime = None):
         """Run once per day, shortly after midnight. Run through
-        self.schedule, setting the 'processed' flag to false for each
-        entry, and updating the times for sunrise and sunset events."""
-
-        now = datetime.now(self.timezone)
+        self.schedule, setting the processed flag to false for each
+        entry, and updating the times for sunrise and sunset events.
+        The schedule is then sorted by time, and self.next_idx set to
+        the first event which has not yet passed.
+
+        now, if given, is the current time in self.timezone."""
+
+        if now is None:
+            now = datetime.now(self.timezone)
+
+        # sunrise and sunset are the same for every event today, so only
+        # ask astral once each, and only if some event needs them
+        sunrise = sunset = None
+        if any(e.type == 'sunrise' for e in self.schedule):
+            sunrise = a.sunrise_utc(now, self.latitude, self.longitude)
+            sunrise = sunrise.astimezone(self.timezone)
+        if any(e.type == 'sunset' for e in self.schedule):
+            sunset = a.sunset_utc(now, self.latitude, self.longitude)
+            sunset = sunset.astimezone(self.timezone)
 
         for e in self.schedule:
-            if e['type'] == 'sunrise':
-                utc_tm = a.sunrise_utc(now, self.latitude, self.longitude)
-                loc_tm = utc_tm.astimezone(self.timezone)
-            elif e['type'] == 'sunset':
-                utc_tm = a.sunset_utc(now, self.latitude, self.longitude)
-                loc_tm = utc_tm.astimezone(self.timezone)
-            elif e['type'] == 'fixed':
-                loc_tm = datetime.combine(now.date(), e['base_time'],
+            if e.type == 'sunrise':
+                loc_tm = sunrise
+            elif e.type == 'sunset':
+                loc_tm = sunset
+            elif e.type == 'fixed':
+                loc_tm = datetime.combine(now.date(), e.base_time,
                                           self.timezone)
             else:
-                raise ValueError(f"Illegal schedule type {e['type']}")
+                raise ValueError(f"Illegal schedule type {e.type}")
 
-            loc_tm += timedelta(minutes=e['offset'])
-            loc_tm += timedelta(seconds=randint(0, e['random']*60))
+            loc_tm += timedelta(minutes=e.offset)
+            loc_tm += timedelta(seconds=randint(0, e.random*60))
             # TODO: possible bug here, if the additions above cause
             # loc_tm to roll over midnight - it won't get processed in
             # that case
-            e['time'] = loc_tm.time()
+            e.time = loc_tm.time()
 
-            e['processed'] = (e['time'] <= now.time())
+            e.processed = (e.time <= now.time())
 
+        self.schedule.sort(key=lambda e: e.time)
+        self.next_idx = sum(1 for e in self.schedule if e.processed)
         self.sched_reset_for = now.date()
 
     def on(self) -> bool:
         self.state = True
+        self.state_str = "on"
         logger.info(f"{self.name}: Turned ON")
+        self.notify_pair()
+        self._wake_timer()
         return True
 
     def off(self) -> bool:
         self.state = False
+        self.state_str = "off"
         logger.info(f"{self.name}: Turned OFF")
+        self.notify_pair()
+        self._wake_timer()
         return True
 
     def get_state(self) -> str:
-        if self.state:
-            return "on"
-        return "off"
+        return self.state_str